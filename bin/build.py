@@ -25,6 +25,18 @@ def main():
         metavar="MODE",  # Don't print the choices because they're ugly
         help='The mode to build with (see CMakeLists.txt for the specific compiler flags for each mode). Default is "Release".',
     )
+    parser.add_argument(
+        "--arch",
+        default=None,
+        type=str,
+        help="The architecture to optimize Release builds for, passed to -march (e.g. x86-64-v3 for portable AVX2 builds). Defaults to native, the machine building the library.",
+    )
+    parser.add_argument(
+        "--pgo",
+        default=None,
+        choices=["generate", "use"],
+        help="Profile guided optimization stage. Build with 'generate', run a representative workload (e.g. experiments/csf_benchmark.py) to record profiles in build/pgo, then rebuild with 'use'.",
+    )
     parser.add_argument(
         "-t",
         "--target",
@@ -43,11 +55,19 @@ def main():
     if args.target == "package":
         # Set environment variables, and run pip install
         os.environ["CARAMEL_BUILD_MODE"] = args.build_mode
+        if args.arch is not None:
+            os.environ["CARAMEL_ARCH"] = args.arch
+        if args.pgo is not None:
+            os.environ["CARAMEL_PGO"] = args.pgo.upper()
 
         checked_system_call(f"pip3 install . --verbose --force --no-dependencies")
 
     else:
         cmake_command = f"cmake -B build -S . -DPYTHON_EXECUTABLE=$(which python3) -DCMAKE_BUILD_TYPE={args.build_mode}"
+        if args.arch is not None:
+            cmake_command += f' "-DCARAMEL_ARCH={args.arch}"'
+        if args.pgo is not None:
+            cmake_command += f" -DCARAMEL_PGO={args.pgo.upper()}"
         build_command = f"cmake --build build --target {args.target}"
 
         checked_system_call(cmake_command)
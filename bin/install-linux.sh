@@ -13,4 +13,4 @@ apt install cmake -y
 apt install g++
 
 # Install necessary python packages
-pip3 install pytest
\ No newline at end of file
+pip3 install pytest pytest-xdist
\ No newline at end of file
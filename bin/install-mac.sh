@@ -14,4 +14,4 @@ brew install cmake
 # Install openmp (from LLVM)
 brew install libomp
 
-pip3 install pytest
+pip3 install pytest pytest-xdist
@@ -9,4 +9,7 @@ cd $BASEDIR/../build/
 echo "Running the following tests:"
 python3 -m pytest ../ --ignore-glob=../deps --collect-only "$@" 
 echo "Output of the tests:"
-python3 -m pytest ../ --ignore-glob=../deps -s "$@"
\ No newline at end of file
+# Tests are independent, so shard them across all cores with pytest-xdist.
+# Tests sharing a cached CSF are marked with the same xdist_group, which
+# loadgroup keeps on a single worker.
+python3 -m pytest ../ --ignore-glob=../deps -s -n auto --dist loadgroup "$@"
\ No newline at end of file
@@ -1,5 +1,4 @@
 import argparse
-import os
 import time
 
 import caramel
@@ -53,11 +52,7 @@ def main(args):
     csf = caramel.CSF(keys, values)
     construction_time = time.time() - start
 
-    filename = "test_file.csf"
-    csf.save(filename)
-    csf_size = os.path.getsize(filename)
-    csf = caramel.load(filename)
-    os.remove(filename)
+    csf_size = csf.serialized_size()
 
     query_time = 0
     for i, key in enumerate(keys):
@@ -1,6 +1,8 @@
+#include <cstring>
 #include <memory.h>
 #include <src/construct/Construct.h>
 #include <src/construct/Csf.h>
+#include <string_view>
 
 // Pybind11 library
 #include <pybind11/cast.h>
@@ -12,17 +14,160 @@ namespace py = pybind11;
 
 namespace caramel::python {
 
+template <typename T> struct IsFixedLengthString : std::false_type {};
+
+template <size_t N>
+struct IsFixedLengthString<std::array<char, N>> : std::true_type {};
+
+/*
+  Views the contents of every str or bytes key in place, without copying it into
+  a std::string. The views point into the Python objects held by keys (str
+  objects cache their UTF-8 encoding), so keys must outlive the returned views.
+*/
+std::vector<std::string_view> keyViews(const py::tuple &keys) {
+  std::vector<std::string_view> views;
+  views.reserve(keys.size());
+  for (const py::handle &key : keys) {
+    const char *data;
+    Py_ssize_t length;
+    if (PyBytes_Check(key.ptr())) {
+      if (PyBytes_AsStringAndSize(key.ptr(), const_cast<char **>(&data),
+                                  &length) != 0) {
+        throw py::error_already_set();
+      }
+    } else if (PyUnicode_Check(key.ptr())) {
+      data = PyUnicode_AsUTF8AndSize(key.ptr(), &length);
+      if (data == nullptr) {
+        throw py::error_already_set();
+      }
+    } else {
+      throw py::type_error("Keys must be str or bytes, found " +
+                           py::str(key.get_type()).cast<std::string>());
+    }
+    views.emplace_back(data, static_cast<size_t>(length));
+  }
+  return views;
+}
+
+// Below this many keys, starting the OpenMP threads costs more than querying
+// in parallel saves.
+constexpr size_t MIN_KEYS_FOR_PARALLEL_QUERY = 10000;
+
+/*
+  Calls store(i, csf.query(keys[i])) for every key, without the GIL and in
+  parallel for large batches. Queries are independent and store must only
+  write to slot i, so no synchronization is needed.
+*/
+template <typename T, typename StoreFn>
+void queryEach(const Csf<T> &csf, const std::vector<std::string_view> &keys,
+               StoreFn store) {
+  py::gil_scoped_release release;
+  size_t num_keys = keys.size();
+  bool parallel = num_keys >= MIN_KEYS_FOR_PARALLEL_QUERY;
+#pragma omp parallel for default(none)                                         \
+    shared(csf, keys, store, num_keys) if (parallel) schedule(static)
+  for (size_t i = 0; i < num_keys; i++) {
+    store(i, csf.query(keys[i]));
+  }
+}
+
+/*
+  Queries every key and returns the results as a single Python object: a numpy
+  array for integer values, a numpy array of dtype "S<N>" for fixed length
+  strings, and a list of str otherwise. The queries run without the GIL: the
+  key views and the result buffer stay valid without it, since the caller
+  holds references to both.
+*/
+template <typename T>
+py::object queryBatch(const Csf<T> &csf, const py::sequence &key_sequence) {
+  // Holding the keys in a tuple keeps every key object alive while viewed.
+  py::tuple key_tuple(key_sequence);
+  std::vector<std::string_view> keys = keyViews(key_tuple);
+  if constexpr (std::is_arithmetic_v<T>) {
+    py::array_t<T> results(keys.size());
+    T *results_ptr = results.mutable_data();
+    queryEach(csf, keys,
+              [results_ptr](size_t i, T value) { results_ptr[i] = value; });
+    return std::move(results);
+  } else if constexpr (IsFixedLengthString<T>::value) {
+    constexpr size_t length = std::tuple_size_v<T>;
+    auto dtype = py::dtype::from_args(py::str("S" + std::to_string(length)));
+    std::vector<py::ssize_t> shape = {static_cast<py::ssize_t>(keys.size())};
+    py::array results(dtype, shape);
+    char *results_ptr = static_cast<char *>(results.mutable_data());
+    queryEach(csf, keys, [results_ptr](size_t i, const T &value) {
+      std::memcpy(results_ptr + i * length, value.data(), length);
+    });
+    return std::move(results);
+  } else {
+    std::vector<T> results(keys.size());
+    queryEach(csf, keys,
+              [&results](size_t i, T value) { results[i] = std::move(value); });
+    return py::cast(results);
+  }
+}
+
+/*
+  Checks every key against the bloom filter, returning a numpy array of bools.
+  Like queryBatch, the checks run without holding the GIL.
+*/
+py::array_t<bool> containsMany(const BloomFilter &bloom_filter,
+                               const py::sequence &key_sequence) {
+  py::tuple key_tuple(key_sequence);
+  std::vector<std::string_view> keys = keyViews(key_tuple);
+  py::array_t<bool> results(keys.size());
+  bool *results_ptr = results.mutable_data();
+  {
+    py::gil_scoped_release release;
+    for (size_t i = 0; i < keys.size(); i++) {
+      results_ptr[i] = bloom_filter.contains(keys[i]);
+    }
+  }
+  return results;
+}
+
+template <typename T>
+CsfPtr<T> constructFromPython(const py::sequence &keys,
+                              const std::vector<T> &values,
+                              bool use_bloom_filter, bool verbose) {
+  py::tuple key_tuple(keys);
+  std::vector<std::string_view> key_views = keyViews(key_tuple);
+  // Construction never touches Python objects, and key_tuple keeps the viewed
+  // keys alive, so other Python threads can run.
+  py::gil_scoped_release release;
+  return constructCsf<T>(key_views, values, use_bloom_filter, verbose);
+}
+
 template <typename T>
 void bindCsf(py::module &module, const char *name, const uint32_t type_id) {
-  py::class_<Csf<T>, std::shared_ptr<Csf<T>>>(module, name)
-      .def(py::init([](const std::vector<std::string> &keys,
-                       const std::vector<T> &values, bool use_bloom_filter,
-                       bool verbose) {
-             return constructCsf<T>(keys, values, use_bloom_filter, verbose);
-           }),
-           py::arg("keys"), py::arg("values"),
-           py::arg("use_bloom_filter") = true, py::arg("verbose") = true)
+  py::class_<Csf<T>, std::shared_ptr<Csf<T>>> csf_class(module, name);
+  if constexpr (std::is_arithmetic_v<T>) {
+    // Registered first so that it is tried first: numpy arrays of T (and
+    // lists that numpy converts to T without loss) are copied into the values
+    // in one block, instead of converting every element through Python.
+    csf_class.def(py::init([](const py::sequence &keys,
+                              const py::array_t<T, py::array::c_style> &values,
+                              bool use_bloom_filter, bool verbose) {
+                    if (values.ndim() != 1) {
+                      throw py::value_error("Values must be one dimensional.");
+                    }
+                    std::vector<T> value_vector(values.data(),
+                                                values.data() + values.size());
+                    return constructFromPython<T>(keys, value_vector,
+                                                  use_bloom_filter, verbose);
+                  }),
+                  py::arg("keys"), py::arg("values"),
+                  py::arg("use_bloom_filter") = true,
+                  py::arg("verbose") = true);
+  }
+  csf_class
+      .def(py::init(&constructFromPython<T>), py::arg("keys"),
+           py::arg("values"), py::arg("use_bloom_filter") = true,
+           py::arg("verbose") = true)
       .def("query", &Csf<T>::query, py::arg("key"))
+      .def("query_batch", &queryBatch<T>, py::arg("keys"))
+      .def("get_bloom_filter", &Csf<T>::getBloomFilter)
+      .def("serialized_size", &Csf<T>::serializedSize)
       // Call save / load through a lambda to avoid user visibility of type_id.
       .def(
           "save",
@@ -36,14 +181,39 @@ void bindCsf(py::module &module, const char *name, const uint32_t type_id) {
             return Csf<T>::load(filename, type_id);
           },
           py::arg("filename"));
+  csf_class.attr("type_id") = type_id;
+
+  if constexpr (IsFixedLengthString<T>::value) {
+    // Builds the str directly from the value's bytes, rather than returning a
+    // list of single characters for Python to join.
+    csf_class.def(
+        "query_str",
+        [](const Csf<T> &self, std::string_view key) {
+          T value = self.query(key);
+          return py::str(value.data(), value.size());
+        },
+        py::arg("key"));
+  }
 }
 
 PYBIND11_MODULE(_caramel, module) { // NOLINT
+  py::class_<BloomFilter, BloomFilterPtr>(module, "BloomFilter")
+      .def("contains",
+           py::overload_cast<std::string_view>(&BloomFilter::contains,
+                                               py::const_),
+           py::arg("key"))
+      .def("contains_many", &containsMany, py::arg("keys"))
+      .def("size", &BloomFilter::size)
+      .def("num_hashes", &BloomFilter::numHashes);
+
   bindCsf<uint32_t>(module, "CSFUint32", 1);
   bindCsf<uint64_t>(module, "CSFUint64", 2);
   bindCsf<std::array<char, 10>>(module, "CSFChar10", 3);
   bindCsf<std::array<char, 12>>(module, "CSFChar12", 4);
   bindCsf<std::string>(module, "CSFString", 5);
+  module.def("read_type_id",
+             py::overload_cast<const std::string &>(&readTypeId),
+             py::arg("filename"));
   py::register_exception<CsfDeserializationException>(
       module, "CsfDeserializationException");
 }
@@ -6,13 +6,16 @@ from pathlib import Path
 import numpy as np
 
 from ._caramel import (
+    BloomFilter,
     CSFChar10,
     CSFChar12,
     CsfDeserializationException,
     CSFString,
     CSFUint32,
     CSFUint64,
+    read_type_id,
 )
+from ._permute import permute_values
 
 
 def Caramel(
@@ -28,9 +31,15 @@ def Caramel(
 
     Arguments:
         keys: List of hashable keys.
-        values: List of values to use in the CSF.
+        values: List of values to use in the CSF. Passing integer values as a
+            numpy array of the backend's dtype (uint32 or uint64) skips
+            converting them one at a time.
         max_to_infer: If provided, only the first "max_to_infer" values
             will be examinied when inferring the correct CSF backend.
+        multiset_permute_optimization: If True and the values are rows of a
+            multiset, reorders each row with permute_values before building,
+            which makes the per column CSFs smaller. Queries then return each
+            row's values in the permuted order.
 
     Returns:
         A CSF containing the desired key-value mapping.
@@ -48,7 +57,7 @@ def Caramel(
         raise ValueError(f"Keys must be str or bytes, found {type(keys[0])}")
 
     CSFClass = _infer_backend(keys, values, max_to_infer=max_to_infer)
-    if isinstance(CSFClass, MultisetCSF):
+    if CSFClass is MultisetCSF:
         csf = MultisetCSF(
             keys,
             values,
@@ -76,51 +85,79 @@ def load(filename):
     Raises:
         ValueError if the filename does not contain a valid CSF.
     """
-    csf_classes = (CSFUint32, CSFUint64, CSFChar10, CSFChar12, CSFString, MultisetCSF)
-    for csf_class in csf_classes:
-        try:
-            csf = csf_class.load(filename)
-            return _wrap_backend(csf)
-        except CsfDeserializationException as e:
-            continue
-    raise ValueError(f"File {filename} does not contain a deserializable CSF.")
+    if os.path.isdir(filename):
+        return MultisetCSF.load(filename)
+
+    try:
+        csf_class = _BACKENDS_BY_TYPE_ID.get(read_type_id(filename))
+    except CsfDeserializationException:
+        csf_class = None
+    if csf_class is None:
+        raise ValueError(f"File {filename} does not contain a deserializable CSF.")
+    return _wrap_backend(csf_class.load(filename))
+
+
+# Every backend saves its type_id at the start of the file, which load uses to
+# pick the class to deserialize with.
+_BACKENDS_BY_TYPE_ID = {
+    csf_class.type_id: csf_class
+    for csf_class in (CSFUint32, CSFUint64, CSFChar10, CSFChar12, CSFString)
+}
 
 
 class CSFQueryWrapper(object):
-    """Wraps a CSF, applying a postprocessing function to the query results."""
+    """
+    Wraps a CSF, applying a postprocessing function to the query results.
 
-    def __init__(self, csf, postprocess_fn):
+    If postprocess_batch_fn is provided, it is applied to the whole output of
+    query_batch at once; otherwise postprocess_fn is applied to each result.
+    """
+
+    def __init__(self, csf, postprocess_fn, postprocess_batch_fn=None):
         self._csf = csf
         self._postprocess_fn = postprocess_fn
+        self._postprocess_batch_fn = postprocess_batch_fn
 
     def query(self, q):
         return self._postprocess_fn(self._csf.query(q))
 
+    def query_batch(self, keys):
+        results = self._csf.query_batch(keys)
+        if self._postprocess_batch_fn:
+            return self._postprocess_batch_fn(results)
+        return [self._postprocess_fn(result) for result in results]
+
     def __getattr__(self, name):
         return getattr(self._csf, name)
 
 
+# Integer value types keyed on (dtype.kind, dtype.itemsize). Integer types not
+# listed here are stored in a CSFUint32.
+_INTEGER_BACKENDS = {("u", 8): CSFUint64}
+
+# Backends for str / bytes values where every value has the given length.
+# Values of any other (or mixed) length are stored in a CSFString.
+_FIXED_LENGTH_BACKENDS = {10: CSFChar10, 12: CSFChar12}
+
+
 def _infer_backend(keys, values, max_to_infer=None):
     """Returns a CSF class, selected based on the key / value types."""
 
-    if np.issubdtype(type(values[0]), np.integer):
-        if np.issubdtype(type(values[0]), np.uint64):
-            return CSFUint64
-        return CSFUint32
-
     if isinstance(values[0], (list, np.ndarray)):
         return MultisetCSF
 
-    if isinstance(values[0], (str, bytes)):
+    value_dtype = np.asarray(values[0]).dtype
+
+    if value_dtype.kind in "iu":
+        return _INTEGER_BACKENDS.get(
+            (value_dtype.kind, value_dtype.itemsize), CSFUint32
+        )
+
+    if value_dtype.kind in "US":
         # call out to one of the dedicated-length strings
         validate_values = values[:max_to_infer] if max_to_infer else values
         value_length = _infer_length(validate_values)
-        if value_length == 10:
-            return CSFChar10
-        elif value_length == 12:
-            return CSFChar12
-        else:
-            return CSFString
+        return _FIXED_LENGTH_BACKENDS.get(value_length, CSFString)
 
     raise ValueError(f"Unsupported value type: {type(values[0])}")
 
@@ -134,12 +171,42 @@ def _infer_length(values):
     return target_length
 
 
+def _encode_keys(keys):
+    """
+    Returns the keys as a list of UTF-8 encoded bytes, leaving bytes keys as
+    they are. CSFs hash the UTF-8 encoding of str keys, so str and bytes keys
+    are interchangeable; encoding once up front lets callers that pass the
+    same keys to several CSFs skip repeating the conversion.
+    """
+    return [key.encode("utf-8") if isinstance(key, str) else key for key in keys]
+
+
+class FixedLengthStringWrapper(object):
+    """
+    Wraps a fixed length string CSF so that queries return str, using the
+    backend's query_str rather than joining the queried characters in Python.
+    """
+
+    def __init__(self, csf):
+        self._csf = csf
+
+    def query(self, q):
+        return self._csf.query_str(q)
+
+    def query_batch(self, keys):
+        # query_batch returns a numpy array of dtype "S<N>" for these classes.
+        return self._csf.query_batch(keys).astype(str)
+
+    def __getattr__(self, name):
+        return getattr(self._csf, name)
+
+
 def _wrap_backend(csf):
     """Wraps the backend CSF (e.g., to apply post-query processing)."""
-    list_to_str_classes = (CSFChar10, CSFChar12)
+    fixed_length_str_classes = (CSFChar10, CSFChar12)
 
-    if isinstance(csf, list_to_str_classes):
-        csf = CSFQueryWrapper(csf, lambda x: "".join(x))
+    if isinstance(csf, fixed_length_str_classes):
+        csf = FixedLengthStringWrapper(csf)
 
     return csf
 
@@ -165,7 +232,11 @@ class MultisetCSF:
         if multiset_permute_optimization:
             values = permute_values(values)
 
-        values = values.T
+        # Each column becomes its own CSF, so lay the columns out contiguously
+        # for the backends to copy in one block.
+        values = np.ascontiguousarray(values.T)
+        # Every column is built from the same keys, so only encode them once.
+        keys = _encode_keys(keys)
 
         self._csfs = []
         for i in range(len(values)):
@@ -182,6 +253,13 @@ class MultisetCSF:
     def query(self, key):
         return [csf.query(key) for csf in self._csfs]
 
+    def query_batch(self, keys):
+        return np.stack([csf.query_batch(keys) for csf in self._csfs], axis=1)
+
+    def serialized_size(self):
+        """Returns the total number of bytes save writes across all columns."""
+        return sum(csf.serialized_size() for csf in self._csfs)
+
     def save(self, filename):
         directory = Path(filename)
         os.mkdir(directory)
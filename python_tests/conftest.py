@@ -0,0 +1,81 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+
+def _inputs_digest(keys, values):
+    """A blake2b digest identifying a CSF's keys and values."""
+    digest = hashlib.blake2b()
+    digest.update(type(keys[0]).__name__.encode("utf-8"))
+    for key in keys:
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        digest.update(len(key).to_bytes(8, "little"))
+        digest.update(key)
+    values = np.asarray(values)
+    digest.update(values.dtype.str.encode("utf-8"))
+    digest.update(values.tobytes())
+    return digest.digest()
+
+
+@pytest.fixture(scope="session")
+def csf_factory():
+    """
+    Builds CSFs through a cache shared by every test in the session. CSF
+    construction is deterministic, so tests that build a CSF from the same
+    class, keys, values and options reuse a single instance. Inputs are keyed
+    by a digest rather than by tuples of every key and value.
+
+    Usage: csf_factory(CSFClass, keys, values, **constructor_kwargs)
+    """
+    cache = {}
+
+    def build(CSFClass, keys, values, **kwargs):
+        cache_key = (
+            CSFClass,
+            _inputs_digest(keys, values),
+            tuple(sorted(kwargs.items())),
+        )
+        if cache_key not in cache:
+            cache[cache_key] = CSFClass(keys, values, **kwargs)
+        return cache[cache_key]
+
+    return build
+
+
+@pytest.fixture
+def fast_tmp(tmp_path):
+    """
+    Directory private to the test for saving CSFs to. It lives in the /dev/shm
+    tmpfs when available, so save / load roundtrips never wait on a disk.
+    """
+    if not os.path.isdir("/dev/shm") or not os.access("/dev/shm", os.W_OK):
+        yield tmp_path
+        return
+    directory = Path(tempfile.mkdtemp(prefix="caramel-", dir="/dev/shm"))
+    yield directory
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture
+def csf_tmpfile(fast_tmp):
+    """
+    Path to save a CSF to, inside a directory private to the test. It is
+    cleaned up afterwards, and tests running in parallel never collide on it.
+    """
+    return str(fast_tmp / "temp.csf")
+
+
+@pytest.fixture(scope="session")
+def full_verify():
+    """
+    Whether roundtrip tests should query every key again after loading a CSF.
+    Set CARAMEL_FULL_VERIFY=1 to enable; otherwise they only check that the
+    loaded CSF serializes to the same bytes as the saved one.
+    """
+    return os.environ.get("CARAMEL_FULL_VERIFY", "0") == "1"
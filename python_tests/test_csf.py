@@ -1,3 +1,5 @@
+import functools
+import hashlib
 import os
 
 import carameldb
@@ -6,83 +8,129 @@ import pytest
 
 pytestmark = [pytest.mark.unit]
 
-gen_str_keys = lambda n: [f"key{i}" for i in range(n)]
-gen_byte_keys = lambda n: [f"key{i}".encode("utf-8") for i in range(n)]
-gen_int_values = lambda n: [i for i in range(n)]
+# Tests that build the same CSF through csf_factory share an xdist group, so
+# that with --dist loadgroup they run on one worker and build it only once.
+UNIFORM_UINT32_GROUP = pytest.mark.xdist_group("uniform_uint32")
+SKEWED_GROUP = pytest.mark.xdist_group("skewed")
+
+_make_byte_keys = lambda n: [f"key{i}".encode("utf-8") for i in range(n)]
+_make_int_values = lambda n: [i for i in range(n)]
+_make_str_values = lambda n: [f"value{i}" for i in range(n)]
+
+# Almost every test uses 1000 elements, so build those inputs once at import.
+# Tests only read their inputs, so sharing them between tests is safe.
+_N = 1000
+_BYTE_KEYS = _make_byte_keys(_N)
+_INT_VALUES = _make_int_values(_N)
+_STR_VALUES = _make_str_values(_N)
+
+gen_byte_keys = lambda n: _BYTE_KEYS if n == _N else _make_byte_keys(n)
+gen_int_values = lambda n: _INT_VALUES if n == _N else _make_int_values(n)
 gen_charX_values = lambda n, x: [str(f"v{i}".ljust(x)[:x]) for i in range(n)]
-gen_str_values = lambda n: [f"value{i}" for i in range(n)]
+gen_str_values = lambda n: _STR_VALUES if n == _N else _make_str_values(n)
+
+
+@functools.lru_cache(maxsize=8)
+def gen_str_keys(n):
+    # Format the keys in numpy's C loop rather than one f-string at a time.
+    return np.char.add("key", np.arange(n).astype(str)).tolist()
+
+
+def gen_skewed_values(n, num_most_common, most_common_value):
+    """
+    Returns n uint32 values: 0, 1, ... for the first n - num_most_common, then
+    most_common_value repeated num_most_common times.
+    """
+    return np.concatenate(
+        [
+            np.arange(n - num_most_common, dtype=np.uint32),
+            np.full(num_most_common, most_common_value, dtype=np.uint32),
+        ]
+    )
 
 
 def assert_all_correct(keys, values, csf):
-    for key, value in zip(keys, values):
-        assert csf.query(key) == value
+    np.testing.assert_array_equal(np.asarray(csf.query_batch(keys)), np.asarray(values))
 
 
-def assert_build_save_load_correct(keys, values, CSFClass, wrap_fn=None):
-    csf = CSFClass(keys, values)
+def file_digest(filename):
+    with open(filename, "rb") as f:
+        return hashlib.blake2b(f.read()).digest()
+
+
+def assert_build_save_load_correct(
+    keys, values, CSFClass, filename, csf_factory, full_verify, wrap_fn=None
+):
+    csf = csf_factory(CSFClass, keys, values)
     if wrap_fn:
         csf = wrap_fn(csf)
     assert_all_correct(keys, values, csf)
-    filename = "temp.csf"
     csf.save(filename)
     csf = CSFClass.load(filename)
     if wrap_fn:
         csf = wrap_fn(csf)
+    if full_verify:
+        assert_all_correct(keys, values, csf)
+    else:
+        # The CSF was verified before saving, so a loaded CSF that saves to
+        # identical bytes must answer every query identically too.
+        resaved_filename = filename + ".resaved"
+        csf.save(resaved_filename)
+        assert file_digest(resaved_filename) == file_digest(filename)
+
+
+def assert_simple_api_correct(keys, values, filename, csf_factory):
+    csf = csf_factory(carameldb.Caramel, keys, values)
     assert_all_correct(keys, values, csf)
-    os.remove(filename)
-
-
-def assert_simple_api_correct(keys, values):
-    csf = carameldb.Caramel(keys, values)
-    assert_all_correct(keys, values, csf)
-    filename = "temp.csf"
     csf.save(filename)
     csf = carameldb.load(filename)
     assert_all_correct(keys, values, csf)
-    os.remove(filename)
-
-
-def test_csf_int():
-    keys = gen_str_keys(1000)
-    values = gen_int_values(1000)
-    assert_build_save_load_correct(keys, values, carameldb.CSFUint32)
-
-
-def test_byte_keys():
-    keys = gen_byte_keys(1000)
-    values = gen_int_values(1000)
-    assert_build_save_load_correct(keys, values, carameldb.CSFUint32)
 
 
-def test_csf_char_10():
-    keys = gen_byte_keys(1000)
-    values = gen_charX_values(1000, 10)
-    wrap_fn = lambda csf: carameldb.CSFQueryWrapper(csf, lambda x: "".join(x))
-    assert_build_save_load_correct(keys, values, carameldb.CSFChar10, wrap_fn)
-
-
-def test_csf_char_12():
-    keys = gen_byte_keys(1000)
-    values = gen_charX_values(1000, 12)
-    wrap_fn = lambda csf: carameldb.CSFQueryWrapper(csf, lambda x: "".join(x))
-    assert_build_save_load_correct(keys, values, carameldb.CSFChar12, wrap_fn)
-
-
-def test_csf_string():
-    keys = gen_byte_keys(1000)
-    values = gen_str_values(1000)
-    assert_build_save_load_correct(keys, values, carameldb.CSFString)
-
-
-def test_csf_load_incorrect_type_fails():
-    filename = "temp.csf"
+@pytest.mark.parametrize(
+    "CSFClass, gen_keys, gen_values, wrap_fn",
+    [
+        pytest.param(
+            carameldb.CSFUint32,
+            gen_str_keys,
+            gen_int_values,
+            None,
+            marks=UNIFORM_UINT32_GROUP,
+        ),
+        (carameldb.CSFUint32, gen_byte_keys, gen_int_values, None),
+        (
+            carameldb.CSFChar10,
+            gen_byte_keys,
+            lambda n: gen_charX_values(n, 10),
+            carameldb._wrap_backend,
+        ),
+        (
+            carameldb.CSFChar12,
+            gen_byte_keys,
+            lambda n: gen_charX_values(n, 12),
+            carameldb._wrap_backend,
+        ),
+        (carameldb.CSFString, gen_byte_keys, gen_str_values, None),
+    ],
+    ids=["int", "byte_keys", "char_10", "char_12", "string"],
+)
+def test_csf_roundtrip(
+    CSFClass, gen_keys, gen_values, wrap_fn, csf_tmpfile, csf_factory, full_verify
+):
+    keys = gen_keys(1000)
+    values = gen_values(1000)
+    assert_build_save_load_correct(
+        keys, values, CSFClass, csf_tmpfile, csf_factory, full_verify, wrap_fn
+    )
+
+
+def test_csf_load_incorrect_type_fails(csf_tmpfile):
     with pytest.raises(carameldb.CsfDeserializationException) as e:
-        keys = [f"key{i}".encode("utf-8") for i in range(1000)]
-        values = [f"value{i}" for i in range(1000)]
+        keys = gen_byte_keys(1000)
+        values = gen_str_values(1000)
         csf = carameldb.CSFString(keys, values)
-        csf.save(filename)
-        csf = carameldb.CSFUint32.load(filename)
-    os.remove(filename)
+        csf.save(csf_tmpfile)
+        csf = carameldb.CSFUint32.load(csf_tmpfile)
 
 
 def test_auto_infer_char10():
@@ -115,7 +163,7 @@ def test_auto_infer_int():
     assert carameldb._infer_backend(keys, values) == carameldb.CSFUint32
 
 
-def test_end_to_end():
+def test_end_to_end(csf_tmpfile, csf_factory):
     # Tests the full backend-inference + wrapper.
     num_elements = 100
     keys = gen_str_keys(num_elements)
@@ -126,13 +174,14 @@ def test_end_to_end():
         gen_charX_values(num_elements, 12),
     ]
     for values in value_sets:
-        assert_simple_api_correct(keys, values)
+        assert_simple_api_correct(keys, values, csf_tmpfile, csf_factory)
 
 
-def test_bloom_filter():
+@SKEWED_GROUP
+def test_bloom_filter(csf_tmpfile, csf_factory):
     keys = gen_str_keys(1000)
-    values = gen_int_values(300) + [300 for _ in range(700)]
-    assert_simple_api_correct(keys, values)
+    values = gen_skewed_values(1000, num_most_common=700, most_common_value=300)
+    assert_simple_api_correct(keys, values, csf_tmpfile, csf_factory)
 
 
 def test_uint32_vs_64_values():
@@ -141,3 +190,94 @@ def test_uint32_vs_64_values():
     assert carameldb._infer_backend(keys, uint32_t_values) == carameldb.CSFUint32
     uint64_t_values = np.array([1, 2, 3], dtype=np.uint64)
     assert carameldb._infer_backend(keys, uint64_t_values) == carameldb.CSFUint64
+
+
+@UNIFORM_UINT32_GROUP
+def test_encoded_keys_match_str_keys(csf_factory):
+    keys = gen_str_keys(1000)
+    values = gen_int_values(1000)
+    csf = csf_factory(carameldb.CSFUint32, keys, values)
+    assert_all_correct(carameldb._encode_keys(keys), values, csf)
+
+
+def test_numpy_values(csf_factory):
+    keys = gen_str_keys(1000)
+    values = np.arange(2000, dtype=np.uint32)
+    # Contiguous arrays are copied in one block; strided views are first made
+    # contiguous, and other integer dtypes fall back to elementwise conversion.
+    for numpy_values in (values[:1000], values[::2], values[:1000].astype(np.int64)):
+        csf = carameldb.CSFUint32(keys, numpy_values, verbose=False)
+        assert_all_correct(keys, numpy_values, csf)
+
+
+def test_load_unknown_type_id_fails(csf_tmpfile):
+    with open(csf_tmpfile, "wb") as f:
+        f.write(b"CRML")
+        f.write((1).to_bytes(4, "little"))
+        f.write((1234).to_bytes(4, "little"))
+    with pytest.raises(ValueError):
+        carameldb.load(csf_tmpfile)
+
+
+def test_load_without_header_fails(csf_tmpfile):
+    # Files saved before the header was added start directly with the type_id.
+    with open(csf_tmpfile, "wb") as f:
+        f.write(carameldb.CSFUint32.type_id.to_bytes(4, "little"))
+        f.write(bytes(64))
+    with pytest.raises(carameldb.CsfDeserializationException):
+        carameldb.CSFUint32.load(csf_tmpfile)
+    with pytest.raises(ValueError):
+        carameldb.load(csf_tmpfile)
+
+
+@SKEWED_GROUP
+def test_get_bloom_filter(csf_factory):
+    keys = gen_str_keys(1000)
+    values = gen_skewed_values(1000, num_most_common=700, most_common_value=300)
+    csf = csf_factory(carameldb.Caramel, keys, values)
+    bloom_filter = csf.get_bloom_filter()
+    assert isinstance(bloom_filter, carameldb.BloomFilter)
+    # Every key without the most common value must be in the filter.
+    assert bloom_filter.contains_many(keys[:300]).all()
+    assert bloom_filter.contains(keys[0])
+
+
+@UNIFORM_UINT32_GROUP
+def test_no_bloom_filter_for_uniform_values(csf_factory):
+    keys = gen_str_keys(1000)
+    values = gen_int_values(1000)
+    csf = csf_factory(carameldb.CSFUint32, keys, values)
+    assert csf.get_bloom_filter() is None
+
+
+@SKEWED_GROUP
+def test_bloom_filter_shrinks_skewed_csf(csf_factory):
+    keys = gen_str_keys(1000)
+    values = gen_skewed_values(1000, num_most_common=900, most_common_value=300)
+    # The no bloom filter baseline is built once per session and shared.
+    bloom_size, no_bloom_size = (
+        csf_factory(
+            carameldb.CSFUint32, keys, values, use_bloom_filter=use_bloom_filter
+        ).serialized_size()
+        for use_bloom_filter in (True, False)
+    )
+    assert bloom_size < no_bloom_size
+
+
+@SKEWED_GROUP
+def test_serialized_size_matches_saved_file(csf_tmpfile, csf_factory):
+    keys = gen_str_keys(1000)
+    values = gen_skewed_values(1000, num_most_common=900, most_common_value=300)
+    csf = csf_factory(carameldb.CSFUint32, keys, values)
+    csf.save(csf_tmpfile)
+    assert csf.serialized_size() == os.path.getsize(csf_tmpfile)
+
+
+@SKEWED_GROUP
+def test_bloom_filter_rejects_absent_keys(csf_factory):
+    keys = gen_str_keys(1000)
+    values = gen_skewed_values(1000, num_most_common=900, most_common_value=300)
+    csf = csf_factory(carameldb.CSFUint32, keys, values)
+    absent_keys = np.char.mod("absent%d", np.arange(10000)).tolist()
+    # With 90% of values equal, prefiltering targets a ~21% error rate.
+    assert csf.get_bloom_filter().contains_many(absent_keys).mean() < 0.25
@@ -1,30 +1,35 @@
-import shutil
-
 import carameldb
+import numpy as np
 import pytest
 
 pytestmark = [pytest.mark.unit]
 
 
-def test_multiset_csf():
+def assert_all_correct(keys, values, csf):
+    # Check every key in one batched call, and the single key path on one key.
+    np.testing.assert_array_equal(csf.query_batch(keys), values)
+    np.testing.assert_array_equal(csf.query(keys[0]), values[0])
+
+
+def test_multiset_csf(fast_tmp):
     num_rows = 1000
     num_columns = 10
     keys = [f"key_{i}" for i in range(num_rows)]
-    values = [[j + i for j in range(num_columns)] for i in range(num_rows)]
+    values = (
+        np.arange(num_rows, dtype=np.uint32)[:, None]
+        + np.arange(num_columns, dtype=np.uint32)[None, :]
+    )
 
     csf = carameldb.Caramel(keys, values)
     assert isinstance(csf, carameldb.MultisetCSF)
 
-    for key, value in zip(keys, values):
-        assert csf.query(key) == value
+    assert_all_correct(keys, values, csf)
 
-    save_file = "multiset.csf"
+    save_file = str(fast_tmp / "multiset.csf")
     csf.save(save_file)
     csf = carameldb.load(save_file)
-    shutil.rmtree(save_file)
 
-    for key, value in zip(keys, values):
-        assert csf.query(key) == value
+    assert_all_correct(keys, values, csf)
 
 
 def test_multiset_csf_different_number_of_values():
@@ -36,3 +41,38 @@ def test_multiset_csf_different_number_of_values():
         match="Error transforming values to numpy array. Make sure all rows are the same length.",
     ):
         carameldb.MultisetCSF(keys, values)
+
+
+def test_multiset_csf_permute():
+    num_rows = 2000
+    num_columns = 4
+    keys = [f"key_{i}" for i in range(num_rows)]
+    # Every row holds one common value at a random position, plus unique ones.
+    rng = np.random.default_rng(0)
+    values = rng.integers(1, 1 << 30, size=(num_rows, num_columns), dtype=np.uint32)
+    values[np.arange(num_rows), rng.integers(num_columns, size=num_rows)] = 0
+
+    permuted_csf = carameldb.Caramel(
+        keys, values, multiset_permute_optimization=True, verbose=False
+    )
+    csf = carameldb.Caramel(keys, values, verbose=False)
+
+    # Each row's multiset is kept, and the common value is moved to column 0.
+    results = permuted_csf.query_batch(keys)
+    np.testing.assert_array_equal(np.sort(results, axis=1), np.sort(values, axis=1))
+    assert (results[:, 0] == 0).all()
+    assert permuted_csf.serialized_size() < csf.serialized_size()
+
+
+def test_permute_kernels_agree():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 5, size=(200, 6), dtype=np.uint32)
+
+    vectorized = values.copy()
+    carameldb._permute._permute_numpy(vectorized)
+    looped = values.copy()
+    carameldb._permute._permute_loops(looped)
+
+    np.testing.assert_array_equal(vectorized, looped)
+    np.testing.assert_array_equal(carameldb.permute_values(values), vectorized)
+    np.testing.assert_array_equal(np.sort(vectorized, axis=1), np.sort(values, axis=1))
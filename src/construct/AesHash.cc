@@ -0,0 +1,276 @@
+#include "AesHash.h"
+#include <algorithm>
+#include <array>
+#include <cstring>
+#include <utility>
+
+#ifdef CARAMEL_AES_NI
+#include <immintrin.h>
+#endif
+
+namespace caramel {
+
+namespace {
+
+using Block = std::array<uint8_t, 16>;
+
+// Arbitrary constants (the hexadecimal digits of pi) for the initial state and
+// the round keys of the final mixing rounds.
+constexpr uint64_t INITIAL_STATE[2] = {0x243F6A8885A308D3ULL,
+                                       0x13198A2E03707344ULL};
+constexpr uint64_t FINAL_ROUND_KEYS[3][2] = {
+    {0xA4093822299F31D0ULL, 0x082EFA98EC4E6C89ULL},
+    {0x452821E638D01377ULL, 0xBE5466CF34E90C6CULL},
+    {0xC0AC29B7C97C50DDULL, 0x3F84D5B5B5470917ULL}};
+
+// The AES S-box.
+constexpr uint8_t SBOX[256] = {
+    0x63, 0x7c, 0x77, 0x7b, 0xf2, 0x6b, 0x6f, 0xc5, 0x30, 0x01, 0x67, 0x2b,
+    0xfe, 0xd7, 0xab, 0x76, 0xca, 0x82, 0xc9, 0x7d, 0xfa, 0x59, 0x47, 0xf0,
+    0xad, 0xd4, 0xa2, 0xaf, 0x9c, 0xa4, 0x72, 0xc0, 0xb7, 0xfd, 0x93, 0x26,
+    0x36, 0x3f, 0xf7, 0xcc, 0x34, 0xa5, 0xe5, 0xf1, 0x71, 0xd8, 0x31, 0x15,
+    0x04, 0xc7, 0x23, 0xc3, 0x18, 0x96, 0x05, 0x9a, 0x07, 0x12, 0x80, 0xe2,
+    0xeb, 0x27, 0xb2, 0x75, 0x09, 0x83, 0x2c, 0x1a, 0x1b, 0x6e, 0x5a, 0xa0,
+    0x52, 0x3b, 0xd6, 0xb3, 0x29, 0xe3, 0x2f, 0x84, 0x53, 0xd1, 0x00, 0xed,
+    0x20, 0xfc, 0xb1, 0x5b, 0x6a, 0xcb, 0xbe, 0x39, 0x4a, 0x4c, 0x58, 0xcf,
+    0xd0, 0xef, 0xaa, 0xfb, 0x43, 0x4d, 0x33, 0x85, 0x45, 0xf9, 0x02, 0x7f,
+    0x50, 0x3c, 0x9f, 0xa8, 0x51, 0xa3, 0x40, 0x8f, 0x92, 0x9d, 0x38, 0xf5,
+    0xbc, 0xb6, 0xda, 0x21, 0x10, 0xff, 0xf3, 0xd2, 0xcd, 0x0c, 0x13, 0xec,
+    0x5f, 0x97, 0x44, 0x17, 0xc4, 0xa7, 0x7e, 0x3d, 0x64, 0x5d, 0x19, 0x73,
+    0x60, 0x81, 0x4f, 0xdc, 0x22, 0x2a, 0x90, 0x88, 0x46, 0xee, 0xb8, 0x14,
+    0xde, 0x5e, 0x0b, 0xdb, 0xe0, 0x32, 0x3a, 0x0a, 0x49, 0x06, 0x24, 0x5c,
+    0xc2, 0xd3, 0xac, 0x62, 0x91, 0x95, 0xe4, 0x79, 0xe7, 0xc8, 0x37, 0x6d,
+    0x8d, 0xd5, 0x4e, 0xa9, 0x6c, 0x56, 0xf4, 0xea, 0x65, 0x7a, 0xae, 0x08,
+    0xba, 0x78, 0x25, 0x2e, 0x1c, 0xa6, 0xb4, 0xc6, 0xe8, 0xdd, 0x74, 0x1f,
+    0x4b, 0xbd, 0x8b, 0x8a, 0x70, 0x3e, 0xb5, 0x66, 0x48, 0x03, 0xf6, 0x0e,
+    0x61, 0x35, 0x57, 0xb9, 0x86, 0xc1, 0x1d, 0x9e, 0xe1, 0xf8, 0x98, 0x11,
+    0x69, 0xd9, 0x8e, 0x94, 0x9b, 0x1e, 0x87, 0xe9, 0xce, 0x55, 0x28, 0xdf,
+    0x8c, 0xa1, 0x89, 0x0d, 0xbf, 0xe6, 0x42, 0x68, 0x41, 0x99, 0x2d, 0x0f,
+    0xb0, 0x54, 0xbb, 0x16};
+
+template <typename T> T read(const char *data) {
+  T value;
+  std::memcpy(&value, data, sizeof(T));
+  return value;
+}
+
+/*
+  Reads a key shorter than 16 bytes as the two words of a zero padded block,
+  using at most two overlapping loads instead of a variable length copy.
+*/
+inline std::pair<uint64_t, uint64_t> readShortKey(const char *data,
+                                                  size_t length) {
+  if (length >= 8) {
+    uint64_t high = 0;
+    if (length > 8) {
+      // Drop the bytes of the overlapping load that the low word already has.
+      high = read<uint64_t>(data + length - 8) >> (8 * (16 - length));
+    }
+    return {read<uint64_t>(data), high};
+  }
+  if (length >= 4) {
+    uint64_t tail = read<uint32_t>(data + length - 4);
+    return {read<uint32_t>(data) | (tail >> (8 * (8 - length)) << 32), 0};
+  }
+  uint64_t low = 0;
+  for (size_t i = 0; i < length; i++) {
+    low |= static_cast<uint64_t>(static_cast<uint8_t>(data[i])) << (8 * i);
+  }
+  return {low, 0};
+}
+
+/*
+  Calls absorb with the low and high words of each 16 byte block of the key,
+  as described in AesHash.h, so that both implementations read the key
+  identically. It is always inlined so that the AES-NI rounds inline into
+  hash128AesNi, which is the only function compiled with AES-NI enabled.
+*/
+template <typename AbsorbFn>
+__attribute__((always_inline)) inline void forEachBlock(std::string_view key,
+                                                        AbsorbFn absorb) {
+  size_t length = key.size();
+  const char *data = key.data();
+  if (length < 16) {
+    if (length > 0) {
+      auto [low, high] = readShortKey(data, length);
+      absorb(low, high);
+    }
+    return;
+  }
+  size_t offset = 0;
+  for (; offset + 16 <= length; offset += 16) {
+    absorb(read<uint64_t>(data + offset), read<uint64_t>(data + offset + 8));
+  }
+  if (offset != length) {
+    absorb(read<uint64_t>(data + length - 16),
+           read<uint64_t>(data + length - 8));
+  }
+}
+
+Block toBlock(uint64_t low, uint64_t high) {
+  Block block;
+  std::memcpy(block.data(), &low, sizeof(uint64_t));
+  std::memcpy(block.data() + sizeof(uint64_t), &high, sizeof(uint64_t));
+  return block;
+}
+
+uint8_t xtime(uint8_t value) {
+  return (value << 1) ^ ((value & 0x80) ? 0x1b : 0);
+}
+
+/*
+  One AES encryption round (ShiftRows, SubBytes, MixColumns, then xor with the
+  round key), with the same byte order as the AESENC instruction.
+*/
+Block aesRound(const Block &state, const uint8_t *round_key) {
+  Block shifted;
+  for (uint32_t column = 0; column < 4; column++) {
+    for (uint32_t row = 0; row < 4; row++) {
+      shifted[4 * column + row] = SBOX[state[4 * ((column + row) % 4) + row]];
+    }
+  }
+  Block result;
+  for (uint32_t column = 0; column < 4; column++) {
+    const uint8_t *a = &shifted[4 * column];
+    uint8_t *out = &result[4 * column];
+    out[0] = xtime(a[0]) ^ xtime(a[1]) ^ a[1] ^ a[2] ^ a[3];
+    out[1] = a[0] ^ xtime(a[1]) ^ xtime(a[2]) ^ a[2] ^ a[3];
+    out[2] = a[0] ^ a[1] ^ xtime(a[2]) ^ xtime(a[3]) ^ a[3];
+    out[3] = xtime(a[0]) ^ a[0] ^ a[1] ^ a[2] ^ xtime(a[3]);
+  }
+  for (uint32_t i = 0; i < 16; i++) {
+    result[i] ^= round_key[i];
+  }
+  return result;
+}
+
+Uint128Signature portableHash(std::string_view key, uint64_t seed) {
+  Block state = toBlock(INITIAL_STATE[0] ^ seed, INITIAL_STATE[1] ^ key.size());
+  forEachBlock(key, [&](uint64_t low, uint64_t high) {
+    state = aesRound(state, toBlock(low, high).data());
+  });
+  for (const auto &round_key : FINAL_ROUND_KEYS) {
+    Block round_key_block = toBlock(round_key[0], round_key[1]);
+    state = aesRound(state, round_key_block.data());
+  }
+  Uint128Signature signature;
+  std::memcpy(&signature.first, state.data(), sizeof(uint64_t));
+  std::memcpy(&signature.second, state.data() + sizeof(uint64_t),
+              sizeof(uint64_t));
+  return signature;
+}
+
+void portableHashMany(const std::string_view *keys, size_t num_keys,
+                      uint64_t seed, Uint128Signature *signatures) {
+  for (size_t i = 0; i < num_keys; i++) {
+    signatures[i] = portableHash(keys[i], seed);
+  }
+}
+
+using HashManyFn = void (*)(const std::string_view *keys, size_t num_keys,
+                            uint64_t seed, Uint128Signature *signatures);
+
+// The number of keys each thread hashes at a time in hash128Many.
+constexpr size_t HASH_CHUNK_SIZE = 4096;
+
+#ifdef CARAMEL_AES_NI
+__attribute__((target("aes,sse4.1"), always_inline)) inline Uint128Signature
+aesNiHash(std::string_view key, uint64_t seed) {
+  __m128i state =
+      _mm_set_epi64x(INITIAL_STATE[1] ^ key.size(), INITIAL_STATE[0] ^ seed);
+  // The lambda is a separate function, so it needs the target attribute too.
+  forEachBlock(key, [&](uint64_t low,
+                        uint64_t high) __attribute__((target("aes,sse4.1"))) {
+    state = _mm_aesenc_si128(state, _mm_set_epi64x(high, low));
+  });
+  for (const auto &round_key : FINAL_ROUND_KEYS) {
+    state = _mm_aesenc_si128(state, _mm_set_epi64x(round_key[1], round_key[0]));
+  }
+  return {static_cast<uint64_t>(_mm_cvtsi128_si64(state)),
+          static_cast<uint64_t>(_mm_extract_epi64(state, 1))};
+}
+
+/*
+  The hashes of different keys are independent, so with the per key hash
+  inlined into this loop the CPU overlaps the AES rounds of consecutive keys.
+*/
+__attribute__((target("aes,sse4.1"))) void
+aesNiHashMany(const std::string_view *keys, size_t num_keys, uint64_t seed,
+              Uint128Signature *signatures) {
+  for (size_t i = 0; i < num_keys; i++) {
+    signatures[i] = aesNiHash(keys[i], seed);
+  }
+}
+
+using HashFn = Uint128Signature (*)(std::string_view key, uint64_t seed);
+
+HashFn selectHashFn() {
+  if (AesHash::hasAesNi()) {
+    return AesHash::hash128AesNi;
+  }
+  return AesHash::hash128Portable;
+}
+
+HashManyFn selectHashManyFn() {
+  if (AesHash::hasAesNi()) {
+    return aesNiHashMany;
+  }
+  return portableHashMany;
+}
+#endif
+
+} // namespace
+
+Uint128Signature AesHash::hash128(std::string_view key, uint64_t seed) {
+#ifdef CARAMEL_AES_NI
+  // Picks the implementation once, rather than checking the CPU on every call.
+  static const HashFn hash_fn = selectHashFn();
+  return hash_fn(key, seed);
+#else
+  return portableHash(key, seed);
+#endif
+}
+
+std::vector<Uint128Signature>
+AesHash::hash128Many(const std::vector<std::string_view> &keys, uint64_t seed) {
+#ifdef CARAMEL_AES_NI
+  static const HashManyFn hash_many_fn = selectHashManyFn();
+#else
+  const HashManyFn hash_many_fn = portableHashMany;
+#endif
+  std::vector<Uint128Signature> signatures(keys.size());
+  const std::string_view *key_data = keys.data();
+  Uint128Signature *signature_data = signatures.data();
+  size_t num_keys = keys.size();
+
+  // Every key is hashed independently, so split the keys into chunks that the
+  // threads hash in parallel. The target specific kernels can't be inlined
+  // into the OpenMP region, so each thread calls one per chunk.
+  size_t num_chunks = (num_keys + HASH_CHUNK_SIZE - 1) / HASH_CHUNK_SIZE;
+#pragma omp parallel for default(none)                                         \
+    shared(key_data, signature_data, num_keys, num_chunks, seed, hash_many_fn) \
+    schedule(static)
+  for (size_t chunk = 0; chunk < num_chunks; chunk++) {
+    size_t begin = chunk * HASH_CHUNK_SIZE;
+    size_t chunk_size = std::min(num_keys - begin, size_t{HASH_CHUNK_SIZE});
+    hash_many_fn(key_data + begin, chunk_size, seed, signature_data + begin);
+  }
+  return signatures;
+}
+
+Uint128Signature AesHash::hash128Portable(std::string_view key, uint64_t seed) {
+  return portableHash(key, seed);
+}
+
+#ifdef CARAMEL_AES_NI
+__attribute__((target("aes,sse4.1")))
+Uint128Signature AesHash::hash128AesNi(std::string_view key, uint64_t seed) {
+  return aesNiHash(key, seed);
+}
+
+bool AesHash::hasAesNi() {
+  return __builtin_cpu_supports("aes") && __builtin_cpu_supports("sse4.1");
+}
+#endif
+
+} // namespace caramel
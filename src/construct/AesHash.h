@@ -0,0 +1,51 @@
+#pragma once
+
+#include "SpookyHash.h"
+#include <cstddef>
+#include <cstdint>
+#include <string_view>
+#include <vector>
+
+namespace caramel {
+
+/*
+  A 128 bit keyed hash built from AES encryption rounds. Each 16 byte block of
+  the key is absorbed with a single round, using the block as the round key,
+  and three rounds with fixed round keys mix the final state. On CPUs with
+  AES-NI every round is one instruction; elsewhere the rounds are computed in
+  software, and both produce identical hashes, so CSFs built on one machine
+  can be queried on any other.
+
+  Keys shorter than 16 bytes are zero padded, and the final partial block of a
+  longer key is read as the last 16 bytes of the key (overlapping the previous
+  block), so no bytes past the end of the key are ever read. The key length is
+  mixed into the initial state, so neither case causes collisions between keys
+  of different lengths. Like SpookyHash, the hash assumes a little-endian CPU.
+
+  This is not a cryptographic hash: it is only meant to spread keys uniformly.
+*/
+class AesHash {
+public:
+  static Uint128Signature hash128(std::string_view key, uint64_t seed);
+
+  /*
+    Hashes every key, giving the same signatures as calling hash128 on each.
+    Checks the CPU once per batch instead of once per key, lets the rounds
+    of consecutive keys overlap, and splits the keys across OpenMP threads.
+  */
+  static std::vector<Uint128Signature>
+  hash128Many(const std::vector<std::string_view> &keys, uint64_t seed);
+
+  // The software implementation, which hash128 uses when AES-NI is missing.
+  static Uint128Signature hash128Portable(std::string_view key, uint64_t seed);
+
+#if defined(__x86_64__) || defined(__i386__)
+#define CARAMEL_AES_NI
+  // Only call this if hasAesNi() is true.
+  static Uint128Signature hash128AesNi(std::string_view key, uint64_t seed);
+
+  static bool hasAesNi();
+#endif
+};
+
+} // namespace caramel
@@ -1,25 +1,55 @@
 #pragma once
 
 #include "SpookyHash.h"
+#include <algorithm>
+#include <array>
 #include <cereal/access.hpp>
 #include <cereal/archives/binary.hpp>
+#include <cereal/types/array.hpp>
+#include <cereal/types/vector.hpp>
 #include <cmath>
 #include <memory>
-#include <src/BitArray.h>
+#include <string_view>
 #include <vector>
 
+#if defined(__x86_64__) || defined(__i386__)
+#include <immintrin.h>
+#define CARAMEL_BLOOM_AVX2
+#endif
+
 namespace caramel {
 
+/*
+  A blocked bloom filter: each key hashes to a single 512 bit block, the size of
+  a cache line, and all of its bits are set within that block. A lookup touches
+  one cache line instead of one per hash function, at the cost of a slightly
+  higher error rate for a given size, which the constructor compensates for.
+*/
 class BloomFilter {
 public:
+  static constexpr uint32_t BITS_PER_BLOCK = 512;
+  static constexpr uint32_t WORDS_PER_BLOCK = BITS_PER_BLOCK / 64;
+  static_assert(BITS_PER_BLOCK == 512, "Probes are 9 bits wide.");
+
   BloomFilter(size_t num_elements, float error_rate) {
     size_t size = std::ceil((1 / log(2)) * log2(1.0 / error_rate) *
                             static_cast<float>(num_elements));
 
-    _bitarray = BitArray::make(size);
+    _num_hashes =
+        std::max<size_t>(std::floor((static_cast<float>(size) * log(2)) /
+                                    (static_cast<float>(num_elements))),
+                         1);
+
+    // Keys are not spread evenly across blocks, so a blocked filter needs a
+    // few more bits than a classic one to reach the same error rate.
+    size_t num_blocks =
+        std::max<size_t>((size + BITS_PER_BLOCK - 1) / BITS_PER_BLOCK, 1);
+    while (expectedErrorRate(num_elements, num_blocks, _num_hashes) >
+           error_rate) {
+      num_blocks += std::max<size_t>(num_blocks / 64, 1);
+    }
 
-    _num_hashes = std::floor((static_cast<float>(size) * log(2)) /
-                             (static_cast<float>(num_elements)));
+    _blocks.resize(num_blocks);
   }
 
   static std::shared_ptr<BloomFilter> make(size_t num_elements,
@@ -27,40 +57,172 @@ public:
     return std::make_shared<BloomFilter>(num_elements, error_rate);
   }
 
-  void add(const std::string &key) {
-    std::vector<uint64_t> hash_values = getHashValues(key);
-    for (uint64_t hash : hash_values) {
-      _bitarray->setBit(hash % _bitarray->numBits());
+  /*
+    The single hash a key's bits are all derived from. Callers that add and
+    check the same key can hash it once and pass the hash to both.
+  */
+  static Uint128Signature hash(std::string_view key) {
+    Uint128Signature key_hash = {0, 0};
+    SpookyHash::Hash128(key.data(), key.size(), &key_hash.first,
+                        &key_hash.second);
+    return key_hash;
+  }
+
+  void add(std::string_view key) { add(hash(key)); }
+
+  bool contains(std::string_view key) const { return contains(hash(key)); }
+
+  void add(const Uint128Signature &key_hash) {
+    auto [block_id, probe, probe_increment] = getProbes(key_hash);
+    Block &block = _blocks[block_id];
+    for (size_t i = 0; i < _num_hashes; i++) {
+      uint32_t bit = probe >> PROBE_SHIFT;
+      probe = probe * PROBE_MULTIPLIER + probe_increment;
+      block.words[bit / 64] |= uint64_t(1) << (bit % 64);
     }
   }
 
-  bool contains(const std::string &key) {
-    std::vector<uint64_t> hash_values = getHashValues(key);
-    for (uint64_t hash : hash_values) {
-      if (!(*_bitarray)[hash]) {
-        return false;
+  /*
+    Same as add, but safe to call from several threads at once. The key's bits
+    are gathered into a mask of its block first, so each word of the block
+    takes at most one atomic or.
+  */
+  void addConcurrent(const Uint128Signature &key_hash) {
+    auto [block_id, probe, probe_increment] = getProbes(key_hash);
+    std::array<uint64_t, WORDS_PER_BLOCK> mask = {};
+    for (size_t i = 0; i < _num_hashes; i++) {
+      uint32_t bit = probe >> PROBE_SHIFT;
+      probe = probe * PROBE_MULTIPLIER + probe_increment;
+      mask[bit / 64] |= uint64_t(1) << (bit % 64);
+    }
+    Block &block = _blocks[block_id];
+    for (uint32_t word = 0; word < WORDS_PER_BLOCK; word++) {
+      if (mask[word]) {
+        __atomic_fetch_or(&block.words[word], mask[word], __ATOMIC_RELAXED);
       }
     }
-    return true;
   }
 
-  size_t size() const { return _bitarray->numBits(); }
+  bool contains(const Uint128Signature &key_hash) const {
+    auto [block_id, probe, probe_increment] = getProbes(key_hash);
+    return _contains_fn(_blocks[block_id], probe, probe_increment, _num_hashes);
+  }
+
+  size_t size() const { return _blocks.size() * BITS_PER_BLOCK; }
+
+  size_t numHashes() const { return _num_hashes; }
+
+  /*
+    The expected error rate of a blocked filter with the given shape: the
+    number of keys per block is Poisson distributed, and a block holding j keys
+    has the error rate of a classic filter with BITS_PER_BLOCK bits.
+  */
+  static double expectedErrorRate(size_t num_elements, size_t num_blocks,
+                                  size_t num_hashes) {
+    double keys_per_block = static_cast<double>(num_elements) / num_blocks;
+    double spread = 10 * std::sqrt(keys_per_block) + 10;
+    size_t min_keys = std::max(keys_per_block - spread, 0.0);
+    size_t max_keys = keys_per_block + spread;
+    double error_rate = 0;
+    for (size_t j = min_keys; j <= max_keys; j++) {
+      // Computed in log space so that large blocks do not underflow.
+      double probability =
+          std::exp(-keys_per_block + j * std::log(keys_per_block) -
+                   std::lgamma(j + 1.0));
+      double bit_set = 1 - std::pow(1 - 1.0 / BITS_PER_BLOCK, j * num_hashes);
+      error_rate += probability * std::pow(bit_set, num_hashes);
+    }
+    return error_rate;
+  }
 
 private:
-  std::vector<uint64_t> getHashValues(const std::string &key) {
-    std::vector<uint64_t> hash_values;
-    hash_values.reserve(_num_hashes);
-    for (size_t i = 0; i < _num_hashes; i++) {
-      uint64_t hash = hashWithSeed(key, i);
-      hash_values.push_back(hash % size());
+  struct alignas(64) Block {
+    std::array<uint64_t, WORDS_PER_BLOCK> words = {};
+
+    template <class Archive> void serialize(Archive &archive) {
+      archive(words);
     }
-    return hash_values;
+  };
+
+  // Probes are the states of a 64 bit linear congruential generator, whose top
+  // 9 bits select a bit within the block.
+  static constexpr uint32_t PROBE_SHIFT = 64 - 9;
+  static constexpr uint64_t PROBE_MULTIPLIER = 6364136223846793005ULL;
+
+  struct Probes {
+    uint64_t block_id;
+    uint64_t probe;
+    uint64_t probe_increment;
+  };
+
+  /*
+    Maps a key's hash to its block, plus the seed and increment of the
+    generator whose states give the bits the key sets within the block. Simpler
+    schemes, such as stepping through the block by a fixed stride, correlate
+    the probes enough to noticeably raise the error rate for larger numbers of
+    hashes.
+  */
+  Probes getProbes(const Uint128Signature &key_hash) const {
+    auto [hash1, hash2] = key_hash;
+    // Map hash1 to [0, num_blocks) without a division.
+    uint64_t block_id = static_cast<uint64_t>(
+        (static_cast<__uint128_t>(hash1) * _blocks.size()) >> 64);
+    // The low bits of hash1 barely affect the block, so reuse them.
+    uint64_t probe_increment = ((hash1 << 32) | (hash1 >> 32)) | 1;
+    return {block_id, hash2, probe_increment};
   }
 
-  uint64_t hashWithSeed(const std::string &key, uint64_t seed) {
-    const void *msgPtr = static_cast<const void *>(key.data());
-    size_t length = key.size();
-    return SpookyHash::Hash64(msgPtr, length, seed);
+  using ContainsFn = bool (*)(const Block &block, uint64_t probe,
+                              uint64_t probe_increment, size_t num_hashes);
+
+  /*
+    Accumulates the missing bits instead of returning at the first one, so the
+    only branch is the loop itself. Most queries that reach the filter are for
+    absent keys, where an early exit would be mispredicted at a random probe.
+  */
+  static bool containsScalar(const Block &block, uint64_t probe,
+                             uint64_t probe_increment, size_t num_hashes) {
+    uint64_t missing = 0;
+    for (size_t i = 0; i < num_hashes; i++) {
+      uint32_t bit = probe >> PROBE_SHIFT;
+      probe = probe * PROBE_MULTIPLIER + probe_increment;
+      missing |= ~(block.words[bit / 64] >> (bit % 64));
+    }
+    return !(missing & 1);
+  }
+
+#ifdef CARAMEL_BLOOM_AVX2
+  /*
+    Gathers every probe into a mask of the block, then checks that the block
+    contains the whole mask with two 256 bit tests.
+  */
+  __attribute__((target("avx2"))) static bool
+  containsAvx2(const Block &block, uint64_t probe, uint64_t probe_increment,
+               size_t num_hashes) {
+    alignas(64) std::array<uint64_t, WORDS_PER_BLOCK> mask = {};
+    for (size_t i = 0; i < num_hashes; i++) {
+      uint32_t bit = probe >> PROBE_SHIFT;
+      probe = probe * PROBE_MULTIPLIER + probe_increment;
+      mask[bit / 64] |= uint64_t(1) << (bit % 64);
+    }
+    const auto *block_data = reinterpret_cast<const __m256i *>(&block.words);
+    const auto *mask_data = reinterpret_cast<const __m256i *>(mask.data());
+    return _mm256_testc_si256(_mm256_load_si256(block_data),
+                              _mm256_load_si256(mask_data)) &
+           _mm256_testc_si256(_mm256_load_si256(block_data + 1),
+                              _mm256_load_si256(mask_data + 1));
+  }
+#endif
+
+  // Picks the fastest contains implementation the CPU supports. This runs once
+  // per filter, not once per query.
+  static ContainsFn selectContainsFn() {
+#ifdef CARAMEL_BLOOM_AVX2
+    if (__builtin_cpu_supports("avx2")) {
+      return containsAvx2;
+    }
+#endif
+    return containsScalar;
   }
 
   // Private constructor for cereal
@@ -68,11 +230,12 @@ private:
 
   friend class cereal::access;
   template <class Archive> void serialize(Archive &archive) {
-    archive(_bitarray, _num_hashes);
+    archive(_blocks, _num_hashes);
   }
 
-  BitArrayPtr _bitarray;
+  std::vector<Block> _blocks;
   size_t _num_hashes;
+  ContainsFn _contains_fn = selectContainsFn();
 };
 
 using BloomFilterPtr = std::shared_ptr<BloomFilter>;
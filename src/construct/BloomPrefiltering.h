@@ -5,6 +5,7 @@
 #include <cmath>
 #include <optional>
 #include <string>
+#include <string_view>
 #include <unordered_map>
 #include <vector>
 
@@ -34,9 +35,9 @@ inline float calculateErrorRate(float alpha, float delta) {
 }
 
 template <typename T>
-std::tuple<std::vector<std::string>, std::vector<T>, BloomFilterPtr,
+std::tuple<std::vector<std::string_view>, std::vector<T>, BloomFilterPtr,
            std::optional<T>>
-bloomPrefiltering(const std::vector<std::string> &keys,
+bloomPrefiltering(const std::vector<std::string_view> &keys,
                   const std::vector<T> &values, float delta) {
   auto [highest_frequency, most_common_value] = highestFrequency(values);
   float highest_normalized_frequency =
@@ -52,19 +53,41 @@ bloomPrefiltering(const std::vector<std::string> &keys,
   auto bloom_filter =
       BloomFilter::make(values.size() - highest_frequency, error_rate);
 
+  // Both passes below need every key's hash, so only compute it once.
+  std::vector<Uint128Signature> key_hashes(keys.size());
+  size_t num_keys = keys.size();
+  T common_value = most_common_value;
+
+#pragma omp parallel for default(none) shared(keys, key_hashes, num_keys)
+  for (size_t i = 0; i < num_keys; i++) {
+    key_hashes[i] = BloomFilter::hash(keys[i]);
+  }
+
   // add all keys to bf that do not correspond to the most common element
-  for (size_t i = 0; i < keys.size(); i++) {
-    if (values[i] != most_common_value) {
-      bloom_filter->add(keys[i]);
+#pragma omp parallel for default(none)                                         \
+    shared(values, key_hashes, bloom_filter, num_keys, common_value)
+  for (size_t i = 0; i < num_keys; i++) {
+    if (values[i] != common_value) {
+      bloom_filter->addConcurrent(key_hashes[i]);
     }
   }
 
-  std::vector<std::string> filtered_keys;
+  // Keys without the most common value were all added, so only the rest can
+  // be rejected by the bf.
+  std::vector<uint8_t> in_filter(num_keys);
+#pragma omp parallel for default(none) shared(                                 \
+        values, key_hashes, bloom_filter, num_keys, common_value, in_filter)
+  for (size_t i = 0; i < num_keys; i++) {
+    in_filter[i] =
+        values[i] != common_value || bloom_filter->contains(key_hashes[i]);
+  }
+
+  std::vector<std::string_view> filtered_keys;
   std::vector<T> filtered_values;
 
   // write all (key, value) pairs that the bf claims are in the csf
-  for (size_t i = 0; i < keys.size(); i++) {
-    if (bloom_filter->contains(keys[i])) {
+  for (size_t i = 0; i < num_keys; i++) {
+    if (in_filter[i]) {
       filtered_keys.push_back(keys[i]);
       filtered_values.push_back(values[i]);
     }
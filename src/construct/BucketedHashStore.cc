@@ -1,18 +1,18 @@
 #include "BucketedHashStore.h"
-#include "SpookyHash.h"
+#include "AesHash.h"
 #include <algorithm>
 #include <array>
 #include <stdexcept>
 
 namespace caramel {
 
-Uint128Signature hashKey(const std::string &key, uint64_t seed) {
-  const void *msgPtr = static_cast<const void *>(key.data());
-  size_t length = key.size();
-  uint64_t hash1 = seed;
-  uint64_t hash2 = seed;
-  SpookyHash::Hash128(msgPtr, length, &hash1, &hash2);
-  return {hash1, hash2};
+Uint128Signature hashKey(std::string_view key, uint64_t seed) {
+  return AesHash::hash128(key, seed);
+}
+
+std::vector<Uint128Signature>
+hashKeys(const std::vector<std::string_view> &keys, uint64_t seed) {
+  return AesHash::hash128Many(keys, seed);
 }
 
 uint32_t getBucketID(Uint128Signature signature, uint32_t num_buckets) {
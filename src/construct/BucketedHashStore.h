@@ -4,19 +4,24 @@
 #include <algorithm>
 #include <stdexcept>
 #include <string>
+#include <string_view>
 #include <vector>
 
 namespace caramel {
 
 uint32_t getBucketID(Uint128Signature signature, uint32_t num_buckets);
 
-Uint128Signature hashKey(const std::string &key, uint64_t seed);
+Uint128Signature hashKey(std::string_view key, uint64_t seed);
+
+// Same as calling hashKey on every key, but faster for many keys.
+std::vector<Uint128Signature>
+hashKeys(const std::vector<std::string_view> &keys, uint64_t seed);
 
 template <typename T>
 std::tuple<std::vector<std::vector<Uint128Signature>>,
            std::vector<std::vector<T>>, uint64_t>
-construct(const std::vector<std::string> &keys, const std::vector<T> &values,
-          uint32_t num_buckets, uint64_t seed) {
+construct(const std::vector<std::string_view> &keys,
+          const std::vector<T> &values, uint32_t num_buckets, uint64_t seed) {
   if (keys.size() != values.size()) {
     throw std::invalid_argument("Keys and values must match sizes.");
   }
@@ -24,8 +29,9 @@ construct(const std::vector<std::string> &keys, const std::vector<T> &values,
   std::vector<std::vector<Uint128Signature>> key_buckets(num_buckets);
   std::vector<std::vector<T>> value_buckets(num_buckets);
 
+  std::vector<Uint128Signature> signatures = hashKeys(keys, seed);
   for (uint32_t i = 0; i < keys.size(); i++) {
-    Uint128Signature signature = hashKey(keys[i], seed);
+    const Uint128Signature &signature = signatures[i];
     uint32_t bucket_id = getBucketID(signature, num_buckets);
     if (std::find(key_buckets[bucket_id].begin(), key_buckets[bucket_id].end(),
                   signature) != key_buckets[bucket_id].end()) {
@@ -42,7 +48,7 @@ construct(const std::vector<std::string> &keys, const std::vector<T> &values,
 template <typename T>
 std::tuple<std::vector<std::vector<Uint128Signature>>,
            std::vector<std::vector<T>>, uint64_t>
-partitionToBuckets(const std::vector<std::string> &keys,
+partitionToBuckets(const std::vector<std::string_view> &keys,
                    const std::vector<T> &values, uint32_t bucket_size = 1000,
                    uint32_t num_attempts = 3) {
   if (keys.size() != values.size()) {
@@ -111,4 +111,30 @@ T cannonicalDecode(const BitArrayPtr &bitarray,
   throw std::invalid_argument("Invalid Code Passed");
 }
 
+/*
+  Same as above, but reads the code from the bits of encoded_value, where bit
+  i - 1 of the code is bit i - 1 of the word (least significant bit first).
+*/
+template <typename T>
+T cannonicalDecode(uint64_t encoded_value,
+                   const std::vector<uint32_t> &code_length_counts,
+                   const std::vector<T> &symbols) {
+  int code = 0;
+  int first = 0;
+  int index = 0;
+  for (uint32_t i = 1; i < code_length_counts.size(); i++) {
+    uint32_t next_bit = (encoded_value >> (i - 1)) & 1;
+    code = code | next_bit;
+    int count = code_length_counts[i];
+    if (code - count < first) {
+      return symbols[index + (code - first)];
+    }
+    index += count;
+    first += count;
+    first <<= 1;
+    code <<= 1;
+  }
+  throw std::invalid_argument("Invalid Code Passed");
+}
+
 } // namespace caramel
\ No newline at end of file
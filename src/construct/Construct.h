@@ -13,6 +13,7 @@
 #include <src/solve/Solve.h>
 #include <src/utils/ProgressBar.h>
 #include <src/utils/Timer.h>
+#include <string_view>
 
 namespace caramel {
 
@@ -108,12 +109,13 @@ constructAndSolveSubsystem(const std::vector<Uint128Signature> &key_signatures,
 }
 
 /**
- * Constructs a Csf from the given keys and values.
+ * Constructs a Csf from the given keys and values. The keys are only viewed,
+ * never copied, so the memory they point to must outlive construction.
  */
 template <typename T>
-CsfPtr<T> constructCsf(const std::vector<std::string> &keys,
-                       const std::vector<T> &values, bool use_bloom_filter = true,
-                       bool verbose = true) {
+CsfPtr<T> constructCsf(const std::vector<std::string_view> &keys,
+                       const std::vector<T> &values,
+                       bool use_bloom_filter = true, bool verbose = true) {
   if (values.empty()) {
     throw std::invalid_argument("Values must be non-empty but found length 0.");
   }
@@ -136,7 +138,7 @@ CsfPtr<T> constructCsf(const std::vector<std::string> &keys,
     std::cout << "Applying bloom pre-filtering...";
   }
 
-  std::vector<std::string> filtered_keys = keys;
+  std::vector<std::string_view> filtered_keys = keys;
   std::vector<T> filtered_values = values;
   BloomFilterPtr bloom_filter = nullptr;
   std::optional<T> most_common_value = std::nullopt;
@@ -216,4 +218,12 @@ CsfPtr<T> constructCsf(const std::vector<std::string> &keys,
                       hash_store_seed, bloom_filter, most_common_value);
 }
 
+template <typename T>
+CsfPtr<T> constructCsf(const std::vector<std::string> &keys,
+                       const std::vector<T> &values,
+                       bool use_bloom_filter = true, bool verbose = true) {
+  std::vector<std::string_view> key_views(keys.begin(), keys.end());
+  return constructCsf<T>(key_views, values, use_bloom_filter, verbose);
+}
+
 } // namespace caramel
\ No newline at end of file
@@ -2,6 +2,8 @@
 #include "SpookyHash.h"
 #include <algorithm>
 #include <array>
+#include <cstdint>
+#include <cstring>
 #include <functional>
 #include <vector>
 
@@ -30,14 +32,33 @@ getStartVarLocations(const Uint128Signature &key_signature, uint32_t seed,
 } // namespace caramel
 
 namespace std {
+/*
+  Hashes fixed length strings a 64 bit word at a time instead of a character at
+  a time. N is a compile time constant, so the word loop and the tail copy are
+  fully unrolled into a handful of loads and multiplies.
+*/
 template <std::size_t N> struct hash<std::array<char, N>> {
   size_t operator()(const std::array<char, N> &arr) const {
-    size_t hash = 0;
-    for (const char &c : arr) {
-      hash = hash * 31 + c;
+    uint64_t hash = N;
+    for (std::size_t i = 0; i + sizeof(uint64_t) <= N; i += sizeof(uint64_t)) {
+      uint64_t word;
+      std::memcpy(&word, arr.data() + i, sizeof(uint64_t));
+      hash = mix(hash ^ word);
+    }
+    if constexpr (N % sizeof(uint64_t) != 0) {
+      uint64_t word = 0;
+      std::memcpy(&word, arr.data() + N - N % sizeof(uint64_t),
+                  N % sizeof(uint64_t));
+      hash = mix(hash ^ word);
     }
     return hash;
   }
+
+private:
+  static uint64_t mix(uint64_t value) {
+    value *= 0x9E3779B97F4A7C15ULL;
+    return value ^ (value >> 32);
+  }
 };
 
 } // namespace std
\ No newline at end of file
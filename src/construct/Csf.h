@@ -15,7 +15,10 @@
 #include <memory>
 #include <src/BitArray.h>
 #include <src/construct/BloomFilter.h>
+#include <src/utils/CountingStreamBuf.h>
+#include <src/utils/MappedFile.h>
 #include <src/utils/SafeFileIO.h>
+#include <string_view>
 #include <vector>
 
 namespace caramel {
@@ -32,20 +35,82 @@ public:
       : std::runtime_error("Cannot deserialize CSF: " + message){};
 };
 
+/*
+  Every file written by Csf<T>::save starts with a header of CSF_MAGIC, the
+  CSF_FORMAT_VERSION it was written with, and the type_id of T, followed by
+  the serialized Csf<T>. The version must be bumped whenever the layout of the
+  file or the way keys are hashed changes, since either makes older files
+  unreadable.
+*/
+constexpr char CSF_MAGIC[4] = {'C', 'R', 'M', 'L'};
+constexpr uint32_t CSF_FORMAT_VERSION = 1;
+constexpr size_t CSF_HEADER_SIZE = sizeof(CSF_MAGIC) + 2 * sizeof(uint32_t);
+
+inline void writeHeader(std::ostream &output_stream, uint32_t type_id) {
+  output_stream.write(CSF_MAGIC, sizeof(CSF_MAGIC));
+  output_stream.write(reinterpret_cast<const char *>(&CSF_FORMAT_VERSION),
+                      sizeof(uint32_t));
+  output_stream.write(reinterpret_cast<const char *>(&type_id),
+                      sizeof(uint32_t));
+}
+
+/*
+  Reads and validates the header that Csf<T>::save writes, returning the
+  type_id, so callers can dispatch to the matching Csf<T>::load directly.
+*/
+inline uint32_t readTypeId(std::istream &input_stream) {
+  char magic[sizeof(CSF_MAGIC)];
+  uint32_t version = 0;
+  uint32_t type_id = 0;
+  input_stream.read(magic, sizeof(CSF_MAGIC));
+  input_stream.read(reinterpret_cast<char *>(&version), sizeof(uint32_t));
+  input_stream.read(reinterpret_cast<char *>(&type_id), sizeof(uint32_t));
+  if (!input_stream) {
+    throw CsfDeserializationException("File is too short to contain a header.");
+  }
+  if (!std::equal(magic, magic + sizeof(CSF_MAGIC), CSF_MAGIC)) {
+    throw CsfDeserializationException(
+        "File does not start with the CSF header. It may have been saved by "
+        "an older version of the library, in which case it must be rebuilt.");
+  }
+  if (version != CSF_FORMAT_VERSION) {
+    throw CsfDeserializationException(
+        "File has format version " + std::to_string(version) +
+        " but this version of the library reads format version " +
+        std::to_string(CSF_FORMAT_VERSION) + ".");
+  }
+  return type_id;
+}
+
+inline uint32_t readTypeId(const std::string &filename) {
+  auto input_stream = SafeFileIO::ifstream(filename, std::ios::binary);
+  return readTypeId(input_stream);
+}
+
 template <typename T> class Csf {
 public:
   Csf(const std::vector<SubsystemSolutionSeedPair> &solutions_and_seeds,
       const std::vector<uint32_t> &code_length_counts,
       const std::vector<T> &ordered_symbols, uint32_t hash_store_seed,
       const BloomFilterPtr &bloom_filter, std::optional<T> most_common_value)
-      : _solutions_and_seeds(solutions_and_seeds),
-        _code_length_counts(code_length_counts),
+      : _code_length_counts(code_length_counts),
         _ordered_symbols(ordered_symbols), _hash_store_seed(hash_store_seed),
         _bloom_filter(bloom_filter), _most_common_value(most_common_value) {
     if ((_bloom_filter != nullptr) != (_most_common_value.has_value())) {
       throw std::invalid_argument("If using bloom filter must provide both the "
                                   "bloom filter and the most common value.");
     }
+    // Canonical Huffman codes over uint32_t frequencies are at most 47 bits
+    // long, so query can always accumulate a code in a single uint64_t.
+    if (_code_length_counts.size() - 1 > 64) {
+      throw std::invalid_argument("Code lengths must be at most 64 bits.");
+    }
+    _solutions.reserve(solutions_and_seeds.size());
+    _construction_seeds.reserve(solutions_and_seeds.size());
+    for (const auto &[solution, construction_seed] : solutions_and_seeds) {
+      _solutions.push_back(solution);
+      _construction_seeds.push_back(construction_seed);
+    }
   }
 
   static CsfPtr<T>
@@ -58,7 +123,7 @@ public:
                                     bloom_filter, most_common_value);
   }
 
-  T query(const std::string &key) const {
+  T query(std::string_view key) const {
     if (_bloom_filter && !_bloom_filter->contains(key)) {
       return *_most_common_value;
     }
@@ -66,31 +131,30 @@ public:
     Uint128Signature signature = hashKey(key, _hash_store_seed);
 
     uint32_t bucket_id =
-        getBucketID(signature, /* num_buckets= */ _solutions_and_seeds.size());
+        getBucketID(signature, /* num_buckets= */ _solutions.size());
 
-    auto [solution, construction_seed] = _solutions_and_seeds.at(bucket_id);
+    const BitArray &solution = *_solutions[bucket_id];
+    uint32_t construction_seed = _construction_seeds[bucket_id];
 
-    uint32_t solution_size = solution->numBits();
+    uint32_t solution_size = solution.numBits();
 
     uint32_t max_codelength = _code_length_counts.size() - 1;
 
     std::vector<uint32_t> start_var_locations =
         getStartVarLocations(signature, construction_seed, solution_size);
 
-    BitArrayPtr encoded_value = BitArray::make(max_codelength);
+    // Bit i of the encoded value is the xor of the i-th bits read from each
+    // start location, so accumulate it directly in a word.
+    uint64_t encoded_value = 0;
     for (auto location : start_var_locations) {
-      BitArrayPtr temp = BitArray::make(max_codelength);
       for (uint32_t i = 0; i < max_codelength; i++) {
-        if ((*solution)[location]) {
-          temp->setBit(i);
-        }
+        encoded_value ^= static_cast<uint64_t>(solution[location]) << i;
         if (location == solution_size - 1) {
           location = 0;
         } else {
           location++;
         }
       }
-      *encoded_value ^= *temp;
     }
 
     return cannonicalDecode(encoded_value, _code_length_counts,
@@ -99,19 +163,22 @@ public:
 
   void save(const std::string &filename, const uint32_t type_id = 0) const {
     auto output_stream = SafeFileIO::ofstream(filename, std::ios::binary);
-    output_stream.write(reinterpret_cast<const char *>(&type_id),
-                        sizeof(uint32_t));
+    writeHeader(output_stream, type_id);
     cereal::BinaryOutputArchive oarchive(output_stream);
     oarchive(*this);
   }
 
   static CsfPtr<T> load(const std::string &filename,
                         const uint32_t type_id = 0) {
-    auto input_stream = SafeFileIO::ifstream(filename, std::ios::binary);
-    // Check the type_id before deserializing a (potentially large) CSF.
-    uint32_t type_id_found = 0;
-    input_stream.read(reinterpret_cast<char *>(&type_id_found),
-                      sizeof(uint32_t));
+    // Deserialize straight from a memory mapping of the file rather than
+    // through a buffered file stream.
+    MappedFile file(filename);
+    // The whole file is read once, front to back.
+    file.adviseSequential();
+    MappedFileStreamBuf file_buffer(file);
+    std::istream input_stream(&file_buffer);
+    // Check the header before deserializing a (potentially large) CSF.
+    uint32_t type_id_found = readTypeId(input_stream);
     if (type_id != type_id_found) {
       throw CsfDeserializationException(
           "Expected type_id to be " + std::to_string(type_id) +
@@ -125,7 +192,21 @@ public:
     return deserialize_into;
   }
 
-  uint32_t size() const { return 0; }
+  BloomFilterPtr getBloomFilter() const { return _bloom_filter; }
+
+  /*
+    The number of bytes save writes, including the header, computed by
+    serializing into a stream that only counts bytes.
+  */
+  size_t serializedSize() const {
+    CountingStreamBuf counting_buffer;
+    std::ostream output_stream(&counting_buffer);
+    {
+      cereal::BinaryOutputArchive oarchive(output_stream);
+      oarchive(*this);
+    }
+    return CSF_HEADER_SIZE + counting_buffer.count();
+  }
 
 private:
   // Private constructor for cereal
@@ -133,11 +214,15 @@ private:
 
   friend class cereal::access;
   template <class Archive> void serialize(Archive &archive) {
-    archive(_solutions_and_seeds, _code_length_counts, _ordered_symbols,
-            _hash_store_seed, _bloom_filter, _most_common_value);
+    archive(_solutions, _construction_seeds, _code_length_counts,
+            _ordered_symbols, _hash_store_seed, _bloom_filter,
+            _most_common_value);
   }
 
-  std::vector<SubsystemSolutionSeedPair> _solutions_and_seeds;
+  // The solution and construction seed of each bucket, stored as parallel
+  // arrays indexed by bucket id.
+  std::vector<BitArrayPtr> _solutions;
+  std::vector<uint32_t> _construction_seeds;
   std::vector<uint32_t> _code_length_counts;
   std::vector<T> _ordered_symbols;
   uint32_t _hash_store_seed;
@@ -1,23 +1,29 @@
 #include "GaussianElimination.h"
+#include <utility>
+#include <vector>
 
 namespace caramel {
 
 BitArrayPtr
 gaussianElimination(const DenseSystemPtr &dense_system,
                     const std::vector<uint32_t> &relevant_equation_ids) {
-  std::unordered_map<uint32_t, uint32_t> first_vars;
-  for (uint32_t equation_id : relevant_equation_ids) {
-    first_vars[equation_id] = dense_system->getFirstVar(equation_id);
+  // first_vars[i] is the first var of equation relevant_equation_ids[i].
+  // Swapping two equations swaps their contents but not their ids, so
+  // indexing by position (rather than hashing the id on every access in the
+  // quadratic loop below) stays correct.
+  int num_equations = relevant_equation_ids.size();
+  std::vector<uint32_t> first_vars(num_equations);
+  for (int index = 0; index < num_equations; index++) {
+    first_vars[index] = dense_system->getFirstVar(relevant_equation_ids[index]);
   }
 
-  int num_equations = relevant_equation_ids.size();
   for (int top_index = 0; top_index < num_equations - 1; top_index++) {
+    uint32_t top_eq_id = relevant_equation_ids[top_index];
     for (int bot_index = top_index + 1; bot_index < num_equations;
          bot_index++) {
-      uint32_t top_eq_id = relevant_equation_ids[top_index];
       uint32_t bot_eq_id = relevant_equation_ids[bot_index];
 
-      if (first_vars[top_eq_id] == first_vars[bot_eq_id]) {
+      if (first_vars[top_index] == first_vars[bot_index]) {
         // Since both virst vars are equal we'd like to eliminate one of them
         // via xor. The leading var in the top equation is above the leading var
         // in the bot equation so eliminate this variable from the bot equation.
@@ -29,21 +35,19 @@ gaussianElimination(const DenseSystemPtr &dense_system,
               " has all coefficients = 0 but constant is 1.");
         }
 
-        first_vars[bot_eq_id] = dense_system->getFirstVar(bot_eq_id);
+        first_vars[bot_index] = dense_system->getFirstVar(bot_eq_id);
       }
 
-      if (first_vars[top_eq_id] > first_vars[bot_eq_id]) {
+      if (first_vars[top_index] > first_vars[bot_index]) {
         dense_system->swapEquations(top_eq_id, bot_eq_id);
-        auto temp_first_vars = first_vars[top_eq_id];
-        first_vars[top_eq_id] = first_vars[bot_eq_id];
-        first_vars[bot_eq_id] = temp_first_vars;
+        std::swap(first_vars[top_index], first_vars[bot_index]);
       }
     }
   }
 
   uint32_t solution_size = dense_system->solutionSize();
   BitArrayPtr solution = BitArray::make(solution_size);
-  for (int i = relevant_equation_ids.size() - 1; i >= 0; i--) {
+  for (int i = num_equations - 1; i >= 0; i--) {
     uint32_t equation_id = relevant_equation_ids[i];
     if (dense_system->isIdentity(equation_id)) {
       continue;
@@ -51,7 +55,7 @@ gaussianElimination(const DenseSystemPtr &dense_system,
 
     auto [equation, constant] = dense_system->getEquation(equation_id);
     if (constant ^ BitArray::scalarProduct(equation, solution)) {
-      solution->setBit(first_vars[equation_id]);
+      solution->setBit(first_vars[i]);
     }
   }
 
@@ -0,0 +1,33 @@
+#pragma once
+
+#include <streambuf>
+
+namespace caramel {
+
+/*
+  A std::streambuf that discards everything written to it and only counts the
+  bytes, so the size of a serialized object can be measured without writing
+  it anywhere.
+*/
+class CountingStreamBuf : public std::streambuf {
+public:
+  size_t count() const { return _count; }
+
+protected:
+  std::streamsize xsputn(const char *, std::streamsize count) override {
+    _count += count;
+    return count;
+  }
+
+  int_type overflow(int_type character) override {
+    if (!traits_type::eq_int_type(character, traits_type::eof())) {
+      _count++;
+    }
+    return traits_type::not_eof(character);
+  }
+
+private:
+  size_t _count = 0;
+};
+
+} // namespace caramel
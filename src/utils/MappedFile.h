@@ -0,0 +1,89 @@
+#pragma once
+
+#include <fcntl.h>
+#include <stdexcept>
+#include <streambuf>
+#include <string>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+namespace caramel {
+
+/*
+  A read-only memory mapping of an entire file. The mapping is released when
+  the MappedFile is destroyed.
+*/
+class MappedFile {
+public:
+  explicit MappedFile(const std::string &filename) {
+    int fd = ::open(filename.c_str(), O_RDONLY);
+    if (fd < 0) {
+      throw std::runtime_error("Unable to open input file '" + filename + "'");
+    }
+
+    struct stat file_stat;
+    if (::fstat(fd, &file_stat) != 0) {
+      ::close(fd);
+      throw std::runtime_error("Unable to stat input file '" + filename + "'");
+    }
+    _size = file_stat.st_size;
+
+    if (_size > 0) {
+      void *data = ::mmap(nullptr, _size, PROT_READ, MAP_PRIVATE, fd, 0);
+      if (data == MAP_FAILED) {
+        ::close(fd);
+        throw std::runtime_error("Unable to map input file '" + filename +
+                                 "'");
+      }
+      _data = static_cast<char *>(data);
+    }
+    // The mapping stays valid after the file descriptor is closed.
+    ::close(fd);
+  }
+
+  MappedFile(const MappedFile &) = delete;
+  MappedFile &operator=(const MappedFile &) = delete;
+
+  ~MappedFile() {
+    if (_data != nullptr) {
+      ::munmap(_data, _size);
+    }
+  }
+
+  /*
+    Hints that the mapping will be read once from start to end, so the kernel
+    reads ahead aggressively and can drop pages soon after they are read. This
+    is only a hint, so failures are ignored.
+  */
+  void adviseSequential() const {
+    if (_data != nullptr) {
+      ::madvise(_data, _size, MADV_SEQUENTIAL);
+      ::madvise(_data, _size, MADV_WILLNEED);
+    }
+  }
+
+  const char *data() const { return _data; }
+
+  size_t size() const { return _size; }
+
+private:
+  char *_data = nullptr;
+  size_t _size = 0;
+};
+
+/*
+  A std::streambuf that reads straight from the memory of a MappedFile, so the
+  file can be deserialized through a std::istream without first being copied
+  through a file stream's buffer. The MappedFile must outlive the streambuf.
+*/
+class MappedFileStreamBuf : public std::streambuf {
+public:
+  explicit MappedFileStreamBuf(const MappedFile &file) {
+    // The get area is never written through, the cast only satisfies setg.
+    char *begin = const_cast<char *>(file.data());
+    setg(begin, begin, begin + file.size());
+  }
+};
+
+} // namespace caramel
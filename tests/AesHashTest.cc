@@ -0,0 +1,87 @@
+#include <gtest/gtest.h>
+#include <random>
+#include <set>
+#include <src/construct/AesHash.h>
+#include <string>
+
+namespace caramel::tests {
+
+std::string randomBytes(size_t length, std::mt19937 &gen) {
+  std::uniform_int_distribution<int> dist(0, 255);
+  std::string bytes(length, 0);
+  for (auto &byte : bytes) {
+    byte = static_cast<char>(dist(gen));
+  }
+  return bytes;
+}
+
+#ifdef CARAMEL_AES_NI
+TEST(AesHashTest, TestAesNiMatchesPortable) {
+  if (!AesHash::hasAesNi()) {
+    GTEST_SKIP() << "AES-NI is not supported on this CPU.";
+  }
+  std::mt19937 gen(42);
+  // Cover the empty key, keys shorter than a block, exact multiples of a
+  // block, and keys with a partial final block.
+  for (size_t length = 0; length < 100; length++) {
+    std::string key = randomBytes(length, gen);
+    for (uint64_t seed : {0, 1, 341}) {
+      ASSERT_EQ(AesHash::hash128AesNi(key, seed),
+                AesHash::hash128Portable(key, seed))
+          << "Mismatch for a key of length " << length;
+    }
+  }
+}
+#endif
+
+TEST(AesHashTest, TestHashManyMatchesHash) {
+  std::mt19937 gen(7);
+  // Enough keys that hash128Many splits them into several chunks.
+  std::vector<std::string> keys;
+  for (size_t i = 0; i < 10000; i++) {
+    keys.push_back(randomBytes(i % 100, gen));
+  }
+  std::vector<std::string_view> key_views(keys.begin(), keys.end());
+  std::vector<Uint128Signature> signatures =
+      AesHash::hash128Many(key_views, 341);
+  ASSERT_EQ(signatures.size(), keys.size());
+  for (size_t i = 0; i < keys.size(); i++) {
+    ASSERT_EQ(signatures[i], AesHash::hash128(keys[i], 341));
+  }
+}
+
+TEST(AesHashTest, TestNoCollisions) {
+  std::set<std::pair<uint64_t, uint64_t>> hashes;
+  uint32_t num_keys = 100000;
+  for (uint32_t i = 0; i < num_keys; i++) {
+    auto [hash1, hash2] = AesHash::hash128("key" + std::to_string(i), 0);
+    hashes.insert({hash1, hash2});
+  }
+  ASSERT_EQ(hashes.size(), num_keys);
+}
+
+TEST(AesHashTest, TestSeedAndLengthChangeHash) {
+  ASSERT_FALSE(AesHash::hash128("key", 0) == AesHash::hash128("key", 1));
+  // Zero padding must not make a short key collide with its padded form.
+  using namespace std::string_literals;
+  ASSERT_FALSE(AesHash::hash128("key"s, 0) == AesHash::hash128("key\0"s, 0));
+  ASSERT_FALSE(AesHash::hash128("", 0) == AesHash::hash128("\0"s, 0));
+}
+
+TEST(AesHashTest, TestBitsAreBalanced) {
+  // Every output bit should be set for about half of the keys.
+  uint32_t num_keys = 10000;
+  std::vector<uint32_t> bit_counts(128, 0);
+  for (uint32_t i = 0; i < num_keys; i++) {
+    auto [hash1, hash2] = AesHash::hash128(std::to_string(i), 7);
+    for (uint32_t bit = 0; bit < 64; bit++) {
+      bit_counts[bit] += (hash1 >> bit) & 1;
+      bit_counts[64 + bit] += (hash2 >> bit) & 1;
+    }
+  }
+  for (uint32_t count : bit_counts) {
+    ASSERT_NEAR(count, num_keys / 2, num_keys / 20);
+  }
+}
+
+} // namespace caramel::tests
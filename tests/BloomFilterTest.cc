@@ -32,4 +32,41 @@ TEST(BloomFilterTest, TestErrorRate) {
   }
 }
 
+TEST(BloomFilterTest, TestNoFalseNegatives) {
+  size_t num_elements = 10000;
+  auto bf = BloomFilter::make(/* num_elements= */ num_elements,
+                              /* error_rate= */ 0.001);
+
+  for (size_t i = 0; i < num_elements; i++) {
+    bf->add("key_" + std::to_string(i));
+  }
+
+  for (size_t i = 0; i < num_elements; i++) {
+    ASSERT_TRUE(bf->contains("key_" + std::to_string(i)));
+  }
+}
+
+TEST(BloomFilterTest, TestConcurrentAddMatchesAdd) {
+  size_t num_elements = 10000;
+  auto serial_bf = BloomFilter::make(num_elements, /* error_rate= */ 0.01);
+  auto concurrent_bf = BloomFilter::make(num_elements, /* error_rate= */ 0.01);
+
+  std::vector<Uint128Signature> key_hashes(num_elements);
+  for (size_t i = 0; i < num_elements; i++) {
+    key_hashes[i] = BloomFilter::hash("key_" + std::to_string(i));
+    serial_bf->add(key_hashes[i]);
+  }
+
+#pragma omp parallel for default(none)                                         \
+    shared(concurrent_bf, key_hashes, num_elements)
+  for (size_t i = 0; i < num_elements; i++) {
+    concurrent_bf->addConcurrent(key_hashes[i]);
+  }
+
+  for (size_t i = 0; i < 2 * num_elements; i++) {
+    auto key_hash = BloomFilter::hash("key_" + std::to_string(i));
+    ASSERT_EQ(serial_bf->contains(key_hash), concurrent_bf->contains(key_hash));
+  }
+}
+
 } // namespace caramel::tests
\ No newline at end of file
@@ -52,10 +52,11 @@ TEST(BucketedHashStoreTest, TestGetBucketID) {
 TEST(BucketedHashStoreTest, TestPartitioning) {
   uint32_t size = 100;
   auto keys = manyRandomStrings(size);
+  std::vector<std::string_view> key_views(keys.begin(), keys.end());
   auto values = genRandomVector(size);
 
   auto [key_buckets, value_buckets, seed] =
-      partitionToBuckets<uint32_t>(keys, values, 20);
+      partitionToBuckets<uint32_t>(key_views, values, 20);
 
   for (auto key : keys) {
     Uint128Signature signature = hashKey(key, 0);
@@ -68,7 +69,7 @@ TEST(BucketedHashStoreTest, TestPartitioning) {
 }
 
 TEST(BucketedHashStoreTest, TestDuplicateKey) {
-  std::vector<std::string> keys = {"HAHA", "HAHA"};
+  std::vector<std::string_view> keys = {"HAHA", "HAHA"};
   auto values = genRandomVector(2);
 
   ASSERT_THROW(partitionToBuckets<uint32_t>(keys, values, 1),
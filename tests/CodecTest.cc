@@ -2,6 +2,7 @@
 #include <gtest/gtest.h>
 #include <random>
 #include <src/construct/Codec.h>
+#include <src/construct/ConstructUtils.h>
 
 namespace caramel::tests {
 
@@ -33,4 +34,41 @@ TEST(CodecTest, TestRandomCannonicalHuffman) {
   }
 }
 
+TEST(CodecTest, TestCannonicalDecodeFromWord) {
+  std::vector<uint32_t> symbols = genRandomVector(/* size = */ 100);
+  auto [codedict, code_length_counts, sorted_symbols] =
+      cannonicalHuffman<uint32_t>(symbols);
+
+  for (auto [expected_key, code] : codedict) {
+    uint64_t encoded_value = 0;
+    for (uint32_t i = 0; i < code->numBits(); i++) {
+      encoded_value |= static_cast<uint64_t>((*code)[i]) << i;
+    }
+    uint32_t actual_key = cannonicalDecode<uint32_t>(
+        encoded_value, code_length_counts, sorted_symbols);
+    ASSERT_EQ(actual_key, expected_key);
+  }
+}
+
+TEST(CodecTest, TestFixedLengthStringCannonicalHuffman) {
+  std::vector<std::array<char, 10>> symbols;
+  for (uint32_t i = 0; i < 100; i++) {
+    std::array<char, 10> symbol;
+    symbol.fill(' ');
+    std::string value = "v" + std::to_string(i % 17);
+    std::copy(value.begin(), value.end(), symbol.begin());
+    symbols.push_back(symbol);
+  }
+
+  auto [codedict, code_length_counts, sorted_symbols] =
+      cannonicalHuffman<std::array<char, 10>>(symbols);
+  ASSERT_EQ(codedict.size(), 17);
+
+  for (auto [expected_key, code] : codedict) {
+    std::array<char, 10> actual_key = cannonicalDecode<std::array<char, 10>>(
+        code, code_length_counts, sorted_symbols);
+    ASSERT_EQ(actual_key, expected_key);
+  }
+}
+
 } // namespace caramel::tests
\ No newline at end of file